@@ -1,25 +1,46 @@
 import random
+import time
 piece_score = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "P": 1}
 CHECKMATE = 1000
 STALEMATE = 0
 DEPTH = 3
+PROOF_INFINITY = 10 ** 9  # Proof and disproof number of a solved node
+rng = random.Random()  # Used for all move randomness, see seedSearch()
+nodes_searched = 0  # Positions visited by the searches, reset by the caller
+killer_moves = {}  # Last move that caused a beta cutoff at each depth, tried first by sibling nodes
+DOUBLED_PAWN = 0.25  # Penalty for each extra pawn on a file
+ISOLATED_PAWN = 0.2  # Penalty for a pawn with no friendly pawns on the neighbouring files
+PASSED_PAWN = [0, 1.0, 0.6, 0.4, 0.25, 0.15, 0.1, 0]  # Bonus for a passed pawn by row, from White's point of view
+PAWN_CACHE_SIZE = 1 << 16
+pawn_cache = {}  # Pawn structure scores by GameState.pawn_hash
+pawn_cache_hits = 0
+pawn_cache_misses = 0
+"""
+Seed the move randomness so searches are reproducible
+"""
+def seedSearch(seed):
+    rng.seed(seed)
+
+
 """
 Picks a random move
 """
 def findRandomMove(valid_moves):
-    return valid_moves[random.randint(0, len(valid_moves)-1)]
+    return valid_moves[rng.randint(0, len(valid_moves)-1)]
 
 
 """
 Pick the best move based on how many pieces can be captured, min max without recursion
 """
 def findBestMoveNoRecursion(game_state, valid_moves):
+    global nodes_searched
     turn_multiplier = 1 if game_state.whiteToMove else -1
     opponent_min_max_score = CHECKMATE
     best_player_move = None
-    random.shuffle(valid_moves)
+    rng.shuffle(valid_moves)
     for player_move in valid_moves:
         game_state.make_move(player_move)
+        nodes_searched += 1
         opponent_move = game_state.getValidMoves()
         if game_state.stalemate:
             opponent_max_score = STALEMATE
@@ -29,13 +50,14 @@ def findBestMoveNoRecursion(game_state, valid_moves):
             opponent_max_score = -CHECKMATE
             for opp in opponent_move:
                 game_state.make_move(opp)
-                game_state.getValidMoves()
+                nodes_searched += 1
+                game_state.update_game_status()  # Leaf node only needs to know if the game is over
                 if game_state.checkmate:
                     score = CHECKMATE
                 elif game_state.stalemate:
                     score = STALEMATE
                 else:
-                    score = -turn_multiplier * scoreBoard(game_state.board)  # For white score needs to be as high as
+                    score = -turn_multiplier * scoreBoard(game_state)        # For white score needs to be as high as
                 if score > opponent_max_score:                               # possible and for black the score needs to
                     opponent_max_score = score                               # be as negative as possible
                 game_state.undo_move()
@@ -47,33 +69,39 @@ def findBestMoveNoRecursion(game_state, valid_moves):
 
 
 """
-Helper method to make first recursive call
+Helper method to make first recursive call. Searches depth plies, DEPTH if not given
 """
-def findBestMove(game_state, valid_moves):
+def findBestMove(game_state, valid_moves, depth=None):
     global next_move
+    if depth is None:
+        depth = DEPTH
     next_move = None
-    random.shuffle(valid_moves)
-    findMoveNegaMaxAlphaBeta(game_state, valid_moves, DEPTH, -CHECKMATE, CHECKMATE, 1 if game_state.whiteToMove else -1)
-    # findMoveMinMax(game_state, valid_moves, DEPTH, game_state.whiteToMove)
+    killer_moves.clear()
+    rng.shuffle(valid_moves)
+    findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, -CHECKMATE, CHECKMATE, 1 if game_state.whiteToMove else -1)
+    # findMoveMinMax(game_state, valid_moves, depth, game_state.whiteToMove)
     return next_move
 
 
 """
-Implementing Min Max algorithm to find best move
+Implementing Min Max algorithm to find best move. root_depth is the depth of the first call, where next_move is set
 """
-def findMoveMinMax(game_state, valid_moves, depth, whiteToMove):
-    global next_move
+def findMoveMinMax(game_state, valid_moves, depth, whiteToMove, root_depth=None):
+    global next_move, nodes_searched
+    nodes_searched += 1
+    if root_depth is None:
+        root_depth = depth
     if depth == 0:
         return scoreBoard(game_state)
     if whiteToMove:
         max_score = -CHECKMATE
         for move in valid_moves:
             game_state.make_move(move)
-            next_moves = game_state.getValidMoves()
-            score = findMoveMinMax(game_state, next_moves, depth - 1, False)
+            next_moves = nextMoves(game_state, depth - 1)
+            score = findMoveMinMax(game_state, next_moves, depth - 1, False, root_depth)
             if score > max_score:
                 max_score = score
-                if depth == DEPTH:
+                if depth == root_depth:
                     next_move = move
             game_state.undo_move()
         return max_score
@@ -81,42 +109,65 @@ def findMoveMinMax(game_state, valid_moves, depth, whiteToMove):
         min_score = CHECKMATE
         for move in valid_moves:
             game_state.make_move(move)
-            next_moves = game_state.getValidMoves()
-            score = findMoveMinMax(game_state, next_moves, depth - 1, True)
+            next_moves = nextMoves(game_state, depth - 1)
+            score = findMoveMinMax(game_state, next_moves, depth - 1, True, root_depth)
             if score < min_score:
                 min_score = score
-                if depth == DEPTH:
+                if depth == root_depth:
                     next_move = move
             game_state.undo_move()
         return min_score
 
 
 """
-Implementing Nega max algorithm to find the best move
+Implementing Nega max algorithm to find the best move. root_depth is the depth of the first call, where next_move is set
 """
-def findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, alpha, beta,  turn_multiplier):
-    global next_move
+def findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, alpha, beta,  turn_multiplier, root_depth=None):
+    global next_move, nodes_searched
+    nodes_searched += 1
+    if root_depth is None:
+        root_depth = depth
     if depth == 0:
         return turn_multiplier * scoreBoard(game_state)
     # Ordering all the moves - best to the worst so that we can start pruning worse move trees later on
+    if valid_moves is None:  # Killer move, then captures, then quiet moves - generated only if there is no cutoff
+        valid_moves = game_state.staged_moves(killer_moves.get(depth))
     max_score = -CHECKMATE
+    moves_searched = 0
     for move in valid_moves:
+        moves_searched += 1
         game_state.make_move(move)
-        next_moves = game_state.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(game_state, next_moves, depth - 1, -beta, -alpha, -turn_multiplier)
+        if depth == 1:
+            game_state.update_game_status()  # Leaf node only needs to know if the game is over
+        score = -findMoveNegaMaxAlphaBeta(game_state, None, depth - 1, -beta, -alpha, -turn_multiplier, root_depth)
         if score > max_score:
             max_score = score
-            if depth == DEPTH:
+            if depth == root_depth:
                 next_move = move
         game_state.undo_move()
         if max_score > alpha:  # Pruning happens here
             alpha = max_score
         if alpha >= beta:
+            killer_moves[depth] = move
             break
+    if moves_searched == 0:  # No valid moves - checkmate or stalemate
+        game_state.update_game_status()
+        return turn_multiplier * scoreBoard(game_state)
     return max_score
 
 
 
+"""
+Valid moves for the node reached after a move in findMoveMinMax. Leaf nodes are never expanded, so they only get their
+checkmate and stalemate flags set for scoreBoard() instead of a full move list
+"""
+def nextMoves(game_state, depth):
+    if depth == 0:
+        game_state.update_game_status()
+        return []
+    return game_state.getValidMoves()
+
+
 """
 Positive score is good for White and a negative score is good for Black
 """
@@ -128,11 +179,184 @@ def scoreBoard(game_state):
             return CHECKMATE  # Black wins
     elif game_state.stalemate:
         return STALEMATE
+    return scoreMaterial(game_state.board) + pawnStructureScore(game_state)
+
+
+"""
+Material balance of the board. Positive score is good for White
+"""
+def scoreMaterial(board):
     score = 0
-    for row in game_state.board:
+    for row in board:
         for square in row:
             if square[0] == 'w':
                 score += piece_score[square[1]]
             elif square[0] == 'b':
                 score -= piece_score[square[1]]
     return score
+
+
+"""
+Pawn structure score of the position, looked up by pawn hash. The pawn structure only changes on pawn moves and pawn
+captures, so most positions in a search tree share a cached score
+"""
+def pawnStructureScore(game_state):
+    global pawn_cache_hits, pawn_cache_misses
+    score = pawn_cache.get(game_state.pawn_hash)
+    if score is not None:
+        pawn_cache_hits += 1
+        return score
+    pawn_cache_misses += 1
+    score = evaluatePawnStructure(game_state.board)
+    if len(pawn_cache) >= PAWN_CACHE_SIZE:
+        del pawn_cache[next(iter(pawn_cache))]  # Evict the oldest entry
+    pawn_cache[game_state.pawn_hash] = score
+    return score
+
+
+"""
+Score passed, doubled and isolated pawns. Positive score is good for White
+"""
+def evaluatePawnStructure(board):
+    pawn_rows = {'w': [[] for c in range(8)], 'b': [[] for c in range(8)]}  # Rows of the pawns on each file
+    for r in range(8):
+        for c in range(8):
+            if board[r][c][1] == 'P':
+                pawn_rows[board[r][c][0]][c].append(r)
+    score = 0
+    for color, sign in (('w', 1), ('b', -1)):
+        own = pawn_rows[color]
+        enemy = pawn_rows['b' if color == 'w' else 'w']
+        for c in range(8):
+            if len(own[c]) > 1:
+                score -= sign * DOUBLED_PAWN * (len(own[c]) - 1)
+            neighbours = [f for f in (c - 1, c + 1) if 0 <= f < 8]
+            if own[c] and all(len(own[f]) == 0 for f in neighbours):
+                score -= sign * ISOLATED_PAWN * len(own[c])
+            for r in own[c]:
+                # Passed if no enemy pawn is ahead on this or a neighbouring file
+                if color == 'w':
+                    passed = all(er >= r for f in neighbours + [c] for er in enemy[f])
+                    score += PASSED_PAWN[r] if passed else 0
+                else:
+                    passed = all(er <= r for f in neighbours + [c] for er in enemy[f])
+                    score -= PASSED_PAWN[7 - r] if passed else 0
+    return score
+
+
+"""
+Empty the pawn cache and reset its hit and miss counters
+"""
+def clearPawnCache():
+    global pawn_cache_hits, pawn_cache_misses
+    pawn_cache.clear()
+    pawn_cache_hits = 0
+    pawn_cache_misses = 0
+
+
+"""
+Fraction of pawn structure lookups answered from the cache
+"""
+def pawnCacheHitRate():
+    lookups = pawn_cache_hits + pawn_cache_misses
+    return pawn_cache_hits / lookups if lookups else 0.0
+
+
+"""
+Node of the proof-number search tree. The attacker is to move at OR nodes and the defender at AND nodes. moves_left is
+the number of attacker moves still allowed to deliver mate
+"""
+class ProofNode:
+    def __init__(self, move, parent, attacker_to_move, moves_left):
+        self.move = move
+        self.parent = parent
+        self.attacker_to_move = attacker_to_move
+        self.moves_left = moves_left
+        self.children = None  # None until the node is expanded
+        self.proof = 1
+        self.disproof = 1
+
+
+"""
+Search for a forced mate in at most max_n moves for the player to move, using proof-number search where the attacker
+only plays checking moves. Tries N = 1, 2, ... max_n so the shortest mate is found.
+Returns (status, line, nodes) where status is "mate" with the mating line as a list of moves (longest resistance for
+the defender), "no mate" if it is proven that there is no checking mate within max_n moves, or "unknown" if the node
+or time limit was hit first
+"""
+def findMateInN(game_state, max_n, node_limit=200000, time_limit=10.0):
+    deadline = time.perf_counter() + time_limit
+    nodes = 0
+    for n in range(1, max_n + 1):
+        root = ProofNode(None, None, True, n)
+        while root.proof != 0 and root.disproof != 0:
+            if nodes >= node_limit or time.perf_counter() > deadline:
+                return "unknown", [], nodes
+            # Walk down to the most proving node
+            node = root
+            while node.children is not None:
+                if node.attacker_to_move:
+                    node = min(node.children, key=lambda child: child.proof)
+                else:
+                    node = min(node.children, key=lambda child: child.disproof)
+                game_state.make_move(node.move)
+            nodes += expandProofNode(game_state, node)
+            # Update proof and disproof numbers back up to the root
+            while node.parent is not None:
+                updateProofNumbers(node)
+                node = node.parent
+                game_state.undo_move()
+            updateProofNumbers(root)
+        if root.proof == 0:
+            # The attacker plays its quickest proven mate and the defender the defence that resists longest
+            line = []
+            node = root
+            while node.children:
+                proven = [child for child in node.children if child.proof == 0]
+                node = (min if node.attacker_to_move else max)(proven, key=mateDepth)
+                line.append(node.move)
+            return "mate", line, nodes
+    return "no mate", [], nodes
+
+
+"""
+Number of plies to mate in the proof tree below a proven node, with the attacker taking its quickest proven mate and
+the defender its longest resistance
+"""
+def mateDepth(node):
+    if not node.children:  # Checkmate
+        return 0
+    depths = [mateDepth(child) for child in node.children if child.proof == 0]
+    return 1 + (min(depths) if node.attacker_to_move else max(depths))
+
+
+"""
+Generate the children of a node and set their initial proof and disproof numbers. Returns the number of new nodes
+"""
+def expandProofNode(game_state, node):
+    node.children = []
+    valid_moves = game_state.getValidMoves()
+    if node.attacker_to_move:
+        for move in valid_moves:
+            game_state.make_move(move)
+            if game_state.in_check():  # Only checking moves for the attacker
+                child = ProofNode(move, node, False, node.moves_left - 1)
+                if not game_state.has_legal_move():  # Checkmate
+                    child.proof, child.disproof = 0, PROOF_INFINITY
+                elif child.moves_left == 0:  # Defender survives the last allowed move
+                    child.proof, child.disproof = PROOF_INFINITY, 0
+                node.children.append(child)
+            game_state.undo_move()
+    else:
+        for move in valid_moves:
+            node.children.append(ProofNode(move, node, True, node.moves_left))
+    return len(node.children)
+
+
+def updateProofNumbers(node):
+    if node.attacker_to_move:  # OR node - one proven move is enough
+        node.proof = min([child.proof for child in node.children], default=PROOF_INFINITY)
+        node.disproof = min(sum(child.disproof for child in node.children), PROOF_INFINITY)
+    else:  # AND node - every defence has to be refuted
+        node.proof = min(sum(child.proof for child in node.children), PROOF_INFINITY)
+        node.disproof = min([child.disproof for child in node.children], default=PROOF_INFINITY)
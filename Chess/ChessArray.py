@@ -0,0 +1,202 @@
+"""
+NumPy representation of chess positions. Converts GameState boards to int8 arrays of shape (8, 8) (or (N, 8, 8) for a
+batch of positions) and scores whole batches at once with material and piece-square tables. Used for offline analysis
+where scoring positions one at a time with ChessAI.scoreBoard is too slow.
+"""
+import argparse
+import random
+import time
+import numpy as np
+from Chess import ChessEngine, ChessAI
+
+# White pieces are positive, black pieces are negative and empty squares are 0
+PIECE_CODES = {"--": 0, "wP": 1, "wN": 2, "wB": 3, "wR": 4, "wQ": 5, "wK": 6,
+               "bP": -1, "bN": -2, "bB": -3, "bR": -4, "bQ": -5, "bK": -6}
+CODE_PIECES = {v: k for k, v in PIECE_CODES.items()}
+PIECE_TYPES = "PNBRQK"  # Index + 1 is the code of the white piece
+
+# Piece-square tables from White's point of view in centipawns. Row 0 is rank 8, same as GameState.board
+PIECE_SQUARE_TABLES = {
+    "P": [[0, 0, 0, 0, 0, 0, 0, 0],
+          [50, 50, 50, 50, 50, 50, 50, 50],
+          [10, 10, 20, 30, 30, 20, 10, 10],
+          [5, 5, 10, 25, 25, 10, 5, 5],
+          [0, 0, 0, 20, 20, 0, 0, 0],
+          [5, -5, -10, 0, 0, -10, -5, 5],
+          [5, 10, 10, -20, -20, 10, 10, 5],
+          [0, 0, 0, 0, 0, 0, 0, 0]],
+    "N": [[-50, -40, -30, -30, -30, -30, -40, -50],
+          [-40, -20, 0, 0, 0, 0, -20, -40],
+          [-30, 0, 10, 15, 15, 10, 0, -30],
+          [-30, 5, 15, 20, 20, 15, 5, -30],
+          [-30, 0, 15, 20, 20, 15, 0, -30],
+          [-30, 5, 10, 15, 15, 10, 5, -30],
+          [-40, -20, 0, 5, 5, 0, -20, -40],
+          [-50, -40, -30, -30, -30, -30, -40, -50]],
+    "B": [[-20, -10, -10, -10, -10, -10, -10, -20],
+          [-10, 0, 0, 0, 0, 0, 0, -10],
+          [-10, 0, 5, 10, 10, 5, 0, -10],
+          [-10, 5, 5, 10, 10, 5, 5, -10],
+          [-10, 0, 10, 10, 10, 10, 0, -10],
+          [-10, 10, 10, 10, 10, 10, 10, -10],
+          [-10, 5, 0, 0, 0, 0, 5, -10],
+          [-20, -10, -10, -10, -10, -10, -10, -20]],
+    "R": [[0, 0, 0, 0, 0, 0, 0, 0],
+          [5, 10, 10, 10, 10, 10, 10, 5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [0, 0, 0, 5, 5, 0, 0, 0]],
+    "Q": [[-20, -10, -10, -5, -5, -10, -10, -20],
+          [-10, 0, 0, 0, 0, 0, 0, -10],
+          [-10, 0, 5, 5, 5, 5, 0, -10],
+          [-5, 0, 5, 5, 5, 5, 0, -5],
+          [0, 0, 5, 5, 5, 5, 0, -5],
+          [-10, 5, 5, 5, 5, 5, 0, -10],
+          [-10, 0, 5, 0, 0, 0, 0, -10],
+          [-20, -10, -10, -5, -5, -10, -10, -20]],
+    "K": [[-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-20, -30, -30, -40, -40, -30, -30, -20],
+          [-10, -20, -20, -20, -20, -20, -20, -10],
+          [20, 20, 0, 0, 0, 0, 20, 20],
+          [20, 30, 10, 0, 0, 10, 30, 20]]}
+
+
+"""
+Build lookup tables indexed by piece code + 6. MATERIAL has shape (13,) and uses the same piece values as
+ChessAI.scoreMaterial. PIECE_SQUARE has shape (13, 8, 8) and holds material plus the piece-square bonus in pawns, with
+the tables mirrored and negated for Black
+"""
+def buildTables():
+    material = np.zeros(13, dtype=np.float64)
+    piece_square = np.zeros((13, 8, 8), dtype=np.float64)
+    for i, piece in enumerate(PIECE_TYPES):
+        code = i + 1
+        table = np.array(PIECE_SQUARE_TABLES[piece], dtype=np.float64) / 100
+        material[code + 6] = ChessAI.piece_score[piece]
+        material[-code + 6] = -ChessAI.piece_score[piece]
+        piece_square[code + 6] = ChessAI.piece_score[piece] + table
+        piece_square[-code + 6] = -(ChessAI.piece_score[piece] + table[::-1])  # Black's rank 8 is White's rank 1
+    return material, piece_square
+
+
+MATERIAL, PIECE_SQUARE = buildTables()
+ROWS = np.arange(8).reshape(8, 1)
+COLS = np.arange(8).reshape(1, 8)
+
+
+"""
+Convert a GameState.board to an int8 array of shape (8, 8)
+"""
+def boardToArray(board):
+    return np.array([[PIECE_CODES[square] for square in row] for row in board], dtype=np.int8)
+
+
+"""
+Convert a list of GameState.board to an int8 array of shape (N, 8, 8)
+"""
+def boardsToArray(boards):
+    positions = np.empty((len(boards), 8, 8), dtype=np.int8)
+    for i, board in enumerate(boards):
+        positions[i] = [[PIECE_CODES[square] for square in row] for row in board]
+    return positions
+
+
+"""
+Convert an int8 array of shape (8, 8) back to a GameState.board
+"""
+def arrayToBoard(position):
+    return [[CODE_PIECES[int(code)] for code in row] for row in position]
+
+
+"""
+Score a batch of positions of shape (N, 8, 8). Positive score is good for White and a negative score is good for
+Black, same as ChessAI.scoreBoard. With piece_square=False only material is counted, which matches
+ChessAI.scoreMaterial
+"""
+def scoreBoards(positions, piece_square=True):
+    positions = np.asarray(positions)
+    if positions.ndim == 2:  # Single position
+        positions = positions[np.newaxis]
+    index = positions.astype(np.intp) + 6
+    if piece_square:
+        return PIECE_SQUARE[index, ROWS, COLS].sum(axis=(1, 2))
+    return MATERIAL[index].sum(axis=(1, 2))
+
+
+"""
+Collect positions by playing random games from the starting position
+"""
+def randomPositions(count, seed=0):
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        game_state = ChessEngine.GameState()
+        for _ in range(200):
+            valid_moves = game_state.getValidMoves()
+            if len(valid_moves) == 0 or len(boards) >= count:
+                break
+            game_state.make_move(valid_moves[rng.randint(0, len(valid_moves) - 1)])
+            boards.append([row[:] for row in game_state.board])
+    return boards
+
+
+"""
+Compare positions/second of the scalar ChessAI.scoreMaterial and ChessAI.scoreBoard against the vectorized scoreBoards.
+scoreMaterial is the like for like baseline for scoreBoards(piece_square=False), scoreBoard also adds pawn structure
+"""
+def benchmark(count, seed=0):
+    boards = randomPositions(count, seed)
+    game_state = ChessEngine.GameState()
+    pawn_hashes = []
+    for board in boards:
+        game_state.board = board
+        pawn_hashes.append(game_state.computePawnHash())
+    ChessAI.clearPawnCache()
+
+    start = time.perf_counter()
+    material_baseline = [ChessAI.scoreMaterial(board) for board in boards]
+    scalar_material_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for board, pawn_hash in zip(boards, pawn_hashes):
+        game_state.board = board
+        game_state.pawn_hash = pawn_hash
+        ChessAI.scoreBoard(game_state)
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    positions = boardsToArray(boards)
+    convert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    material_scores = scoreBoards(positions, piece_square=False)
+    material_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scoreBoards(positions)
+    piece_square_time = time.perf_counter() - start
+
+    if not np.allclose(material_scores, material_baseline):
+        raise AssertionError("Vectorized material scores do not match scoreMaterial")
+
+    print("Positions:                                 %d" % count)
+    print("scoreMaterial:                             %12.0f positions/s" % (count / scalar_material_time))
+    print("scoreBoard (material + pawn structure):    %12.0f positions/s (pawn cache hit rate %.1f%%)" % (
+        count / scalar_time, 100 * ChessAI.pawnCacheHitRate()))
+    print("boardsToArray:                             %12.0f positions/s" % (count / convert_time))
+    print("scoreBoards (material):                    %12.0f positions/s" % (count / material_time))
+    print("scoreBoards (material + piece-square):     %12.0f positions/s" % (count / piece_square_time))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vectorized batch evaluation against scoreBoard")
+    parser.add_argument("-n", "--positions", type=int, default=10000, help="number of positions to score")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random games generating the positions")
+    args = parser.parse_args()
+    benchmark(args.positions, args.seed)
@@ -0,0 +1,221 @@
+"""
+Search benchmark suite. Runs the ChessAI searches to fixed depths over a fixed set of middlegame, endgame and tactical
+positions and records nodes, time-to-depth, nodes per second, peak memory, pawn cache hit rate and the chosen move.
+Results are written as JSON, and the compare mode flags regressions against a stored baseline. The mates mode solves
+mate puzzles with ChessAI.findMateInN and compares its node count against a negamax search to the mating depth.
+
+    python -m Chess.ChessBenchmark run --output results.json
+    python -m Chess.ChessBenchmark compare baseline.json results.json
+    python -m Chess.ChessBenchmark mates
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from Chess import ChessEngine, ChessAI
+
+POSITIONS = [
+    ("start", "opening", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    ("italian", "middlegame", "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5"),
+    ("queens_gambit", "middlegame", "rnbqkb1r/ppp2ppp/4pn2/3p4/2PP4/2N5/PP2PPPP/R1BQKBNR w KQkq - 2 4"),
+    ("kiwipete", "tactical", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("scholars_mate", "tactical", "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4"),
+    ("hanging_queen", "tactical", "rnb1kbnr/pppp1ppp/8/4p1q1/3PP3/8/PPP2PPP/RNBQKBNR w KQkq - 1 3"),
+    ("rook_endgame", "endgame", "8/5k2/8/8/3K4/8/4P3/4R3 w - - 0 1"),
+    ("king_pawn", "endgame", "8/8/8/3k4/8/8/3PK3/8 w - - 0 1"),
+    ("queen_vs_rook", "endgame", "8/8/3k4/8/8/2QK4/8/5r2 w - - 0 1"),
+]
+
+# Mate puzzles as (name, mate in N, FEN)
+MATE_PUZZLES = [
+    ("back_rank", 1, "6k1/5ppp/8/8/8/8/8/R3K3 w - - 0 1"),
+    ("scholars_mate", 1, "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4"),
+    ("rook_ladder_2", 2, "8/7k/R7/8/8/8/8/1R4K1 w - - 0 1"),
+    ("rook_ladder_3", 3, "8/8/7k/R7/8/8/8/1R4K1 w - - 0 1"),
+]
+
+
+def negamax(game_state, valid_moves, depth):
+    return ChessAI.findBestMove(game_state, valid_moves, depth)
+
+
+def minmax(game_state, valid_moves, depth):
+    ChessAI.next_move = None
+    ChessAI.rng.shuffle(valid_moves)
+    ChessAI.findMoveMinMax(game_state, valid_moves, depth, game_state.whiteToMove)
+    return ChessAI.next_move
+
+
+def noRecursion(game_state, valid_moves, depth):
+    return ChessAI.findBestMoveNoRecursion(game_state, valid_moves)  # Always searches 2 plies
+
+
+# Search functions by name. Each takes a game state, its valid moves and a depth and returns the chosen move
+ENGINES = {"negamax": negamax, "minmax": minmax, "norecursion": noRecursion}
+
+
+"""
+Run one search from a fresh position with the search randomness seeded. The state of ChessAI.rng is restored afterwards
+so callers in the same process aren't affected. Returns the chosen move and the nodes searched
+"""
+def search(engine, fen, depth, seed):
+    game_state = ChessEngine.GameState()
+    game_state.load_fen(fen)
+    valid_moves = game_state.getValidMoves()
+    rng_state = ChessAI.rng.getstate()
+    try:
+        ChessAI.seedSearch(seed)
+        ChessAI.nodes_searched = 0
+        ChessAI.clearPawnCache()  # Every run starts cold so hit rates are comparable
+        move = ENGINES[engine](game_state, valid_moves, depth)
+    finally:
+        ChessAI.rng.setstate(rng_state)
+    return move, ChessAI.nodes_searched
+
+
+"""
+Benchmark one engine at one depth on one position
+"""
+def runOne(engine, name, category, fen, depth, seed, measure_memory):
+    start = time.perf_counter()
+    move, nodes = search(engine, fen, depth, seed)
+    elapsed = time.perf_counter() - start
+    pawn_cache_hit_rate = ChessAI.pawnCacheHitRate()
+    result = {"position": name, "category": category, "engine": engine, "depth": depth, "nodes": nodes,
+              "time_s": elapsed, "nps": nodes / elapsed if elapsed > 0 else 0.0,
+              "move": move.getChessNotation() if move is not None else None, "peak_memory_kb": None,
+              "pawn_cache_hit_rate": pawn_cache_hit_rate}
+    if measure_memory:  # Separate run since tracemalloc slows the search down
+        tracemalloc.start()
+        search(engine, fen, depth, seed)
+        result["peak_memory_kb"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
+
+
+def runSuite(engines, max_depth, seed, measure_memory, positions=None):
+    results = []
+    for name, category, fen in POSITIONS:
+        if positions and name not in positions:
+            continue
+        for engine in engines:
+            # Time-to-depth: every depth up to max_depth is searched from scratch. norecursion has a fixed depth
+            depths = [2] if engine == "norecursion" else range(1, max_depth + 1)
+            for depth in depths:
+                result = runOne(engine, name, category, fen, depth, seed, measure_memory)
+                results.append(result)
+                print("%-14s %-12s depth %d  %9d nodes %9.3fs %9.0f nps %6.1f%% pawn hits  %s" % (
+                    name, engine, depth, result["nodes"], result["time_s"], result["nps"],
+                    100 * result["pawn_cache_hit_rate"], result["move"]))
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(), "seed": seed,
+                     "max_depth": max_depth, "date": time.strftime("%Y-%m-%d %H:%M:%S")},
+            "results": results}
+
+
+"""
+Solve the mate puzzles with findMateInN and with negamax searching 2N - 1 plies, the depth needed to see a mate in N
+"""
+def runMates(seed):
+    results = []
+    for name, mate_in, fen in MATE_PUZZLES:
+        game_state = ChessEngine.GameState()
+        game_state.load_fen(fen)
+        start = time.perf_counter()
+        status, line, mate_nodes = ChessAI.findMateInN(game_state, mate_in)
+        mate_time = time.perf_counter() - start
+        start = time.perf_counter()
+        move, nodes = search("negamax", fen, 2 * mate_in - 1, seed)
+        negamax_time = time.perf_counter() - start
+        result = {"position": name, "mate_in": mate_in, "status": status,
+                  "line": [move.getChessNotation() for move in line], "mate_nodes": mate_nodes,
+                  "mate_time_s": mate_time, "negamax_nodes": nodes, "negamax_time_s": negamax_time,
+                  "negamax_move": move.getChessNotation() if move is not None else None}
+        results.append(result)
+        print("%-14s mate in %d  %-7s %7d nodes %8.3fs  negamax %9d nodes %8.3fs  %s" % (
+            name, mate_in, status, mate_nodes, mate_time, nodes, negamax_time, " ".join(result["line"])))
+    return results
+
+
+"""
+Compare results against a baseline. Node count changes beyond node_tolerance, slowdowns beyond time_tolerance and
+changed moves are reported. Slowdowns under min_time seconds are timer noise and ignored. Returns the number of
+regressions
+"""
+def compare(baseline, current, node_tolerance=0.0, time_tolerance=0.2, min_time=0.05):
+    baseline_results = {(r["position"], r["engine"], r["depth"]): r for r in baseline["results"]}
+    regressions = 0
+    for result in current["results"]:
+        key = (result["position"], result["engine"], result["depth"])
+        base = baseline_results.get(key)
+        if base is None:
+            print("NEW        %s %s depth %d" % key)
+            continue
+        problems = []
+        if result["nodes"] > base["nodes"] * (1 + node_tolerance):
+            problems.append("nodes %d -> %d" % (base["nodes"], result["nodes"]))
+        if result["time_s"] > base["time_s"] * (1 + time_tolerance) and result["time_s"] - base["time_s"] > min_time:
+            problems.append("time %.3fs -> %.3fs" % (base["time_s"], result["time_s"]))
+        if result["move"] != base["move"]:
+            problems.append("move %s -> %s" % (base["move"], result["move"]))
+        if problems:
+            regressions += 1
+            print("REGRESSION %s %s depth %d: %s" % (key + ("; ".join(problems),)))
+        else:
+            print("ok         %s %s depth %d: nodes %d -> %d, time %.3fs -> %.3fs" % (
+                key + (base["nodes"], result["nodes"], base["time_s"], result["time_s"])))
+    total_base = sum(r["time_s"] for r in baseline["results"])
+    total_current = sum(r["time_s"] for r in current["results"])
+    print("Total time %.2fs -> %.2fs, %d regressions" % (total_base, total_current, regressions))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ChessAI search benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmark suite")
+    run_parser.add_argument("--depth", type=int, default=ChessAI.DEPTH, help="maximum search depth")
+    run_parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=list(ENGINES))
+    run_parser.add_argument("--positions", nargs="+", choices=[p[0] for p in POSITIONS])
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement")
+    run_parser.add_argument("--output", help="write the results to this JSON file")
+    run_parser.add_argument("--baseline", help="compare the results against this JSON file")
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    mates_parser = commands.add_parser("mates", help="compare findMateInN against negamax on mate puzzles")
+    mates_parser.add_argument("--seed", type=int, default=0)
+    mates_parser.add_argument("--output", help="write the results to this JSON file")
+    for p in (run_parser, compare_parser):
+        p.add_argument("--node-tolerance", type=float, default=0.0, help="allowed relative increase in nodes")
+        p.add_argument("--time-tolerance", type=float, default=0.2, help="allowed relative increase in time")
+    args = parser.parse_args()
+
+    if args.command == "mates":
+        results = runMates(args.seed)
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(results, file, indent=2)
+        return
+    if args.command == "run":
+        current = runSuite(args.engines, args.depth, args.seed, not args.no_memory, args.positions)
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(current, file, indent=2)
+        if not args.baseline:
+            return
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    else:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        with open(args.current) as file:
+            current = json.load(file)
+    if compare(baseline, current, args.node_tolerance, args.time_tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
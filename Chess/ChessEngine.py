@@ -2,6 +2,18 @@
 Responsible for storing all the info of the current state of the chess game. Also, responsible for determining possible
 moves based on current state. Also keeps move log
 """
+import random
+
+
+"""
+Random 64 bit keys for each pawn on each square. The pawn hash of a position is the XOR of the keys of all its pawns
+"""
+def makePawnKeys():
+    key_rng = random.Random(0)  # Fixed seed so pawn hashes are the same in every run
+    return {piece: [[key_rng.getrandbits(64) for c in range(8)] for r in range(8)] for piece in ('wP', 'bP')}
+
+
+PAWN_KEYS = makePawnKeys()
 
 
 class GameState:
@@ -22,6 +34,10 @@ class GameState:
 
         self.moveFunction = {'P': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves,
                              'B': self.getBishopMoves, 'Q': self.getQueenMoves, 'K': self.getKingMoves}
+        self.captureFunction = {'P': self.getPawnCaptures, 'R': self.getRookCaptures, 'N': self.getKnightCaptures,
+                                'B': self.getBishopCaptures, 'Q': self.getQueenCaptures, 'K': self.getKingCaptures}
+        self.quietFunction = {'P': self.getPawnQuietMoves, 'R': self.getRookQuietMoves, 'N': self.getKnightQuietMoves,
+                              'B': self.getBishopQuietMoves, 'Q': self.getQueenQuietMoves, 'K': self.getKingQuietMoves}
         self.whiteToMove = True
         self.moveLog = []
         self.whiteKingLocation = (7, 4)
@@ -33,8 +49,66 @@ class GameState:
         self.current_castling_rights = CastleRights(True, True, True, True)
         self.castleRightLog = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                             self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.pawn_hash = self.computePawnHash()  # Key of the pawn placement, updated incrementally by make_move()
+        self.pawn_hash_log = [self.pawn_hash]
+        self.in_check_status = None  # Cached result of in_check() for the current position, None if not computed yet
+
+    """
+    Compute the pawn hash of the current board from scratch
+    """
+    def computePawnHash(self):
+        pawn_hash = 0
+        for r in range(len(self.board)):
+            for c in range(len(self.board[r])):
+                if self.board[r][c][1] == 'P':
+                    pawn_hash ^= PAWN_KEYS[self.board[r][c]][r][c]
+        return pawn_hash
 
-    """ 
+    """
+    Set up the position from a FEN string. Halfmove clock and fullmove number are ignored
+    """
+    def load_fen(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("Invalid FEN: " + fen)
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError("Invalid FEN: " + fen)
+        self.board = []
+        for r, rank in enumerate(ranks):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                else:
+                    if char.upper() not in self.moveFunction:
+                        raise ValueError("Invalid FEN: " + fen)
+                    row.append(("w" if char.isupper() else "b") + char.upper())
+                    if char == "K":
+                        self.whiteKingLocation = (r, len(row) - 1)
+                    elif char == "k":
+                        self.blackKingLocation = (r, len(row) - 1)
+            if len(row) != 8:
+                raise ValueError("Invalid FEN: " + fen)
+            self.board.append(row)
+        self.whiteToMove = fields[1] == "w"
+        self.moveLog = []
+        self.checkmate = False
+        self.stalemate = False
+        if fields[3] == "-":
+            self.enpassant_possible = ()
+        else:
+            self.enpassant_possible = (Move.ranks_to_rows[fields[3][1]], Move.files_to_cols[fields[3][0]])
+        self.enpassant_possible_log = [self.enpassant_possible]
+        self.current_castling_rights = CastleRights("K" in fields[2], "k" in fields[2], "Q" in fields[2],
+                                                    "q" in fields[2])
+        self.castleRightLog = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
+                                            self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.pawn_hash = self.computePawnHash()
+        self.pawn_hash_log = [self.pawn_hash]
+        self.in_check_status = None
+
+    """
     Function to execute the move specified by the Player
     """
     def make_move(self, move):
@@ -43,6 +117,7 @@ class GameState:
             self.board[move.end_row][move.end_col] = move.piece_moved
             self.moveLog.append(move)  # Logging each move
             self.whiteToMove = not self.whiteToMove  # Switch turns
+            self.in_check_status = None
             if move.piece_moved == 'wK':  # Update Kings location if King was moved
                 self.whiteKingLocation = (move.end_row, move.end_col)
             elif move.piece_moved == 'bK':  # Update Kings location if King was moved
@@ -78,6 +153,16 @@ class GameState:
             self.castleRightLog.append(CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                                     self.current_castling_rights.wqs, self.current_castling_rights.bqs))
 
+            # Update pawn hash - only pawn moves and pawn captures change the pawn placement
+            if move.piece_moved[1] == 'P':
+                self.pawn_hash ^= PAWN_KEYS[move.piece_moved][move.start_row][move.start_col]
+                if not move.pawn_promotion:
+                    self.pawn_hash ^= PAWN_KEYS[move.piece_moved][move.end_row][move.end_col]
+            if move.piece_captured[1] == 'P':
+                capture_row = move.start_row if move.isEnpassant else move.end_row
+                self.pawn_hash ^= PAWN_KEYS[move.piece_captured][capture_row][move.end_col]
+            self.pawn_hash_log.append(self.pawn_hash)
+
     """
     Function to undo the last move
     """
@@ -104,6 +189,10 @@ class GameState:
             new_rights = self.castleRightLog[-1]  # Reset current castle rights to last one on list
             self.current_castling_rights = CastleRights(new_rights.wks, new_rights.bks, new_rights.wqs, new_rights.bqs)
 
+            # Undo pawn hash
+            self.pawn_hash_log.pop()
+            self.pawn_hash = self.pawn_hash_log[-1]
+
             # Undo castling move
             if move.isCastle:
                 if move.end_col - move.start_col == 2:  # King side castle
@@ -114,6 +203,7 @@ class GameState:
                     self.board[move.end_row][move.end_col+1] = '--'  # Erase old rook
             self.checkmate = False
             self.stalemate = False
+            self.in_check_status = None
 
     """
     Function to update castle rights
@@ -175,7 +265,7 @@ class GameState:
             self.whiteToMove = not self.whiteToMove  # Switch turns back
             self.undo_move()
         if len(moves) == 0:  # Either checkmate or stalemate
-            if self.in_check():
+            if self.is_in_check():
                 self.checkmate = True
             else:
                 self.stalemate = True
@@ -186,6 +276,107 @@ class GameState:
         self.current_castling_rights = temp_castle_rights
         return moves
 
+    """
+    Check if a move does not leave the moving player's King in check
+    """
+    def is_legal_move(self, move):
+        temp_enpassant_possible = self.enpassant_possible
+        temp_castle_rights = CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
+                                          self.current_castling_rights.wqs, self.current_castling_rights.bqs)
+        self.make_move(move)
+        # Switch turns back for in_check() because make_move() switches turns first
+        self.whiteToMove = not self.whiteToMove
+        legal = not self.in_check()
+        self.whiteToMove = not self.whiteToMove  # Switch turns back
+        self.undo_move()
+        self.enpassant_possible = temp_enpassant_possible
+        self.current_castling_rights = temp_castle_rights
+        return legal
+
+    """
+    Determine if the player to move has at least one legal move. Stops at the first legal move found instead of
+    building the full list like getValidMoves()
+    """
+    def has_legal_move(self):
+        # King moves first since they are few and usually the way out of a check, then the pieces with the
+        # fewest candidate moves. Castling is skipped: if castling is legal the King can also step one square
+        king_location = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        moves = []
+        self.getKingMoves(king_location[0], king_location[1], moves)
+        for move in moves:
+            if self.is_legal_move(move):
+                return True
+        color = "w" if self.whiteToMove else "b"
+        for piece in ('N', 'P', 'B', 'R', 'Q'):
+            for r in range(len(self.board)):
+                for c in range(len(self.board[r])):
+                    if self.board[r][c] == color + piece:
+                        moves = []
+                        self.moveFunction[piece](r, c, moves)
+                        for move in moves:
+                            if self.is_legal_move(move):
+                                return True
+        return False
+
+    """
+    Set checkmate and stalemate for the current position without generating every valid move. Whether the player is
+    in check is only computed when there are no legal moves left, and is then cached for is_in_check()
+    """
+    def update_game_status(self):
+        if self.has_legal_move():
+            self.checkmate = False
+            self.stalemate = False
+        elif self.is_in_check():
+            self.checkmate = True
+            self.stalemate = False
+        else:
+            self.checkmate = False
+            self.stalemate = True
+
+    """
+    Generator yielding the valid moves in stages: hash_move first if it is valid here, then captures and promotions,
+    then quiet moves. A stage is only generated when the caller asks for more moves, so a search that cuts off early
+    never pays for the quiet moves. The caller may make and undo each move before asking for the next one
+    """
+    def staged_moves(self, hash_move=None):
+        # 1.) Hash move, regenerated from its start square so it matches the current position
+        if hash_move is not None:
+            piece = self.board[hash_move.start_row][hash_move.start_col]
+            if piece == hash_move.piece_moved and piece[0] == ('w' if self.whiteToMove else 'b'):
+                moves = []
+                if hash_move.isCastle:
+                    self.getCastleMoves(hash_move.start_row, hash_move.start_col, moves)
+                else:
+                    self.moveFunction[piece[1]](hash_move.start_row, hash_move.start_col, moves)
+                for move in moves:
+                    if move == hash_move:
+                        if self.is_legal_move(move):
+                            yield move
+                        break  # Valid or not, the later stages skip hash_move without checking it again
+                else:
+                    hash_move = None
+            else:
+                hash_move = None
+        # 2.) Captures and promotions
+        for move in self.getAllPossibleCaptures():
+            if move != hash_move and self.is_legal_move(move):
+                yield move
+        # 3.) Quiet moves
+        moves = self.getAllPossibleQuietMoves()
+        king_location = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        self.getCastleMoves(king_location[0], king_location[1], moves)
+        for move in moves:
+            if move != hash_move and self.is_legal_move(move):
+                yield move
+
+    """
+    Cached in_check() for the current position. Computed on first use and reset by make_move() and undo_move()
+    """
+    def is_in_check(self):
+        if self.in_check_status is None:
+            self.in_check_status = self.in_check()
+        return self.in_check_status
+
     """
     Determine if player is in check
     """
@@ -221,6 +412,136 @@ class GameState:
                     # Refer Line 23
         return moves
 
+    """
+    Function to determine captures and promotions without considering checks
+    """
+    def getAllPossibleCaptures(self):
+        moves = []
+        for r in range(len(self.board)):
+            for c in range(len(self.board[r])):
+                turn = self.board[r][c][0]
+                if (turn == "w" and self.whiteToMove) or (turn == "b" and not self.whiteToMove):
+                    self.captureFunction[self.board[r][c][1]](r, c, moves)
+        return moves
+
+    """
+    Get all Pawn captures and promotions at a specific location and add to move list
+    """
+    def getPawnCaptures(self, r, c, moves):
+        end_row = r - 1 if self.whiteToMove else r + 1
+        enemy_color = "b" if self.whiteToMove else "w"
+        if (end_row == 0 or end_row == 7) and self.board[end_row][c] == "--":  # Promotion without a capture
+            moves.append(Move((r, c), (end_row, c), self.board))
+        for end_col in (c - 1, c + 1):
+            if 0 <= end_col < 8:
+                if self.board[end_row][end_col][0] == enemy_color:
+                    moves.append(Move((r, c), (end_row, end_col), self.board))
+                elif (end_row, end_col) == self.enpassant_possible:
+                    moves.append(Move((r, c), (end_row, end_col), self.board, isEnpassant=True))
+
+    """
+    Get all captures along the given directions for a sliding piece at a specific location
+    """
+    def getSlidingCaptures(self, r, c, directions, moves):
+        enemy_color = "b" if self.whiteToMove else "w"
+        for d in directions:
+            end_row = r + d[0]
+            end_col = c + d[1]
+            while 0 <= end_row < 8 and 0 <= end_col < 8 and self.board[end_row][end_col] == "--":
+                end_row += d[0]
+                end_col += d[1]
+            if 0 <= end_row < 8 and 0 <= end_col < 8 and self.board[end_row][end_col][0] == enemy_color:
+                moves.append(Move((r, c), (end_row, end_col), self.board))
+
+    def getRookCaptures(self, r, c, moves):
+        self.getSlidingCaptures(r, c, ((-1, 0), (0, -1), (0, 1), (1, 0)), moves)
+
+    def getBishopCaptures(self, r, c, moves):
+        self.getSlidingCaptures(r, c, ((-1, -1), (-1, 1), (1, -1), (1, 1)), moves)
+
+    def getQueenCaptures(self, r, c, moves):
+        self.getRookCaptures(r, c, moves)
+        self.getBishopCaptures(r, c, moves)
+
+    """
+    Get all captures for a piece moving by fixed steps (Knight or King) at a specific location
+    """
+    def getStepCaptures(self, r, c, move_set, moves):
+        enemy_color = "b" if self.whiteToMove else "w"
+        for m in move_set:
+            end_row = r + m[0]
+            end_col = c + m[1]
+            if 0 <= end_row < 8 and 0 <= end_col < 8 and self.board[end_row][end_col][0] == enemy_color:
+                moves.append(Move((r, c), (end_row, end_col), self.board))
+
+    def getKnightCaptures(self, r, c, moves):
+        self.getStepCaptures(r, c, ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (2, -1), (2, 1), (1, -2), (1, 2)), moves)
+
+    def getKingCaptures(self, r, c, moves):
+        self.getStepCaptures(r, c, ((-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1)), moves)
+
+    """
+    Function to determine quiet moves (no captures, promotions or castling) without considering checks
+    """
+    def getAllPossibleQuietMoves(self):
+        moves = []
+        for r in range(len(self.board)):
+            for c in range(len(self.board[r])):
+                turn = self.board[r][c][0]
+                if (turn == "w" and self.whiteToMove) or (turn == "b" and not self.whiteToMove):
+                    self.quietFunction[self.board[r][c][1]](r, c, moves)
+        return moves
+
+    """
+    Get all Pawn pushes that don't promote at a specific location
+    """
+    def getPawnQuietMoves(self, r, c, moves):
+        direction = -1 if self.whiteToMove else 1
+        end_row = r + direction
+        if end_row == 0 or end_row == 7 or self.board[end_row][c] != "--":
+            return
+        moves.append(Move((r, c), (end_row, c), self.board))
+        if r == (6 if self.whiteToMove else 1) and self.board[end_row + direction][c] == "--":
+            moves.append(Move((r, c), (end_row + direction, c), self.board))
+
+    """
+    Get all moves to empty squares along the given directions for a sliding piece at a specific location
+    """
+    def getSlidingQuietMoves(self, r, c, directions, moves):
+        for d in directions:
+            end_row = r + d[0]
+            end_col = c + d[1]
+            while 0 <= end_row < 8 and 0 <= end_col < 8 and self.board[end_row][end_col] == "--":
+                moves.append(Move((r, c), (end_row, end_col), self.board))
+                end_row += d[0]
+                end_col += d[1]
+
+    def getRookQuietMoves(self, r, c, moves):
+        self.getSlidingQuietMoves(r, c, ((-1, 0), (0, -1), (0, 1), (1, 0)), moves)
+
+    def getBishopQuietMoves(self, r, c, moves):
+        self.getSlidingQuietMoves(r, c, ((-1, -1), (-1, 1), (1, -1), (1, 1)), moves)
+
+    def getQueenQuietMoves(self, r, c, moves):
+        self.getRookQuietMoves(r, c, moves)
+        self.getBishopQuietMoves(r, c, moves)
+
+    """
+    Get all moves to empty squares for a piece moving by fixed steps (Knight or King) at a specific location
+    """
+    def getStepQuietMoves(self, r, c, move_set, moves):
+        for m in move_set:
+            end_row = r + m[0]
+            end_col = c + m[1]
+            if 0 <= end_row < 8 and 0 <= end_col < 8 and self.board[end_row][end_col] == "--":
+                moves.append(Move((r, c), (end_row, end_col), self.board))
+
+    def getKnightQuietMoves(self, r, c, moves):
+        self.getStepQuietMoves(r, c, ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (2, -1), (2, 1), (1, -2), (1, 2)), moves)
+
+    def getKingQuietMoves(self, r, c, moves):
+        self.getStepQuietMoves(r, c, ((-1, 0), (-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1)), moves)
+
     """
     Get all Pawn moves at a specific location and add to move list
     """
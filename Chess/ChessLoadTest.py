@@ -0,0 +1,126 @@
+"""
+Load test client for ChessServer. Simulates many concurrent games, each on its own connection: the client plays random
+valid moves for White and asks the engine to answer for Black, until the game ends or reaches the ply limit. Prints
+client side latencies and the server's own metrics at the end.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import time
+from Chess.ChessServer import percentile
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.request_id = 0
+
+    async def request(self, **request):
+        self.request_id += 1
+        request["id"] = self.request_id
+        self.writer.write(json.dumps(request).encode() + b"\n")
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        return json.loads(line)
+
+
+async def connect(host, port, unix_path):
+    if unix_path is not None:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    return Client(reader, writer)
+
+
+"""
+Play one simulated game and record the latency of every request in latencies, keyed by op
+"""
+async def playGame(args, rng, latencies, results):
+    try:
+        client = await connect(args.host, args.port, args.unix)
+    except OSError:
+        results["connect failed"] += 1
+        return
+    try:
+        async def timed(**request):
+            start = time.perf_counter()
+            response = await client.request(**request)
+            latencies[request["op"]].append(time.perf_counter() - start)
+            if not response["ok"]:
+                results[request["op"] + " " + response["error"]] += 1
+            return response
+
+        state = await timed(op="new", time_limit=args.time_limit)
+        if not state["ok"]:
+            return
+        game = state["game"]
+        plies = 0
+        while plies < args.plies and state["status"] == "ongoing":
+            if state["to_move"] == "w":
+                response = await timed(op="move", game=game, move=rng.choice(state["moves"]))
+            else:
+                response = await timed(op="ai", game=game)
+                if not response["ok"] and response["error"] == "busy":  # Back off and retry, not counted as a ply
+                    await asyncio.sleep(args.backoff * (1 + rng.random()))
+                    continue
+            state = response
+            if not state["ok"]:
+                break
+            plies += 1
+        results[state.get("status", "error")] += 1
+        await timed(op="close", game=game)
+    except OSError:
+        results["connection lost"] += 1
+    finally:
+        client.writer.close()
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    latencies = collections.defaultdict(list)
+    results = collections.Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited():
+        async with semaphore:
+            await playGame(args, random.Random(rng.random()), latencies, results)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[limited() for _ in range(args.games)])
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(samples) for samples in latencies.values())
+    print("Games: %d in %.2fs (%.2f games/s, %.1f requests/s)" % (args.games, elapsed, args.games / elapsed,
+                                                                   total / elapsed))
+    print("Results: " + ", ".join("%s=%d" % item for item in sorted(results.items())))
+    for op, samples in sorted(latencies.items()):
+        samples.sort()
+        print("%-6s n=%-6d p50=%8.1fms p95=%8.1fms max=%8.1fms" % (op, len(samples), 1000 * percentile(samples, 50),
+                                                                  1000 * percentile(samples, 95), 1000 * samples[-1]))
+    client = await connect(args.host, args.port, args.unix)
+    print("Server metrics:")
+    print(json.dumps(await client.request(op="metrics"), indent=2))
+    client.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the chess game server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="connect to this Unix socket path instead of TCP")
+    parser.add_argument("--games", type=int, default=200, help="number of games to simulate")
+    parser.add_argument("--concurrency", type=int, default=200, help="games played at the same time")
+    parser.add_argument("--plies", type=int, default=20, help="maximum half moves per game")
+    parser.add_argument("--time-limit", type=float, default=5.0, help="engine seconds per move requested per game")
+    parser.add_argument("--backoff", type=float, default=0.2, help="seconds to wait after a busy response")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 Driver file. Handles user input. Displays current GameState object.
 """
 import pygame as p
-from Chess import ChessEngine, ChessAI
+from Chess import ChessEngine, ChessAI, ChessPGN
 
 p.init()
 BOARD_WIDTH = BOARD_HEIGHT = 512
@@ -10,6 +10,7 @@ MOVE_LOG_WIDTH = 250
 DIMENSION = 8
 SQ_SIZE = BOARD_WIDTH // DIMENSION
 MAX_FPS = 15
+PGN_FILE = "games.pgn"  # Finished games are appended here
 IMAGES = {}
 
 """
@@ -108,6 +109,8 @@ def main():
         drawGameState(screen, game_state, valid_moves, selected_square, move_log_font)
 
         if game_state.checkmate or game_state.stalemate:
+            if not game_over:  # Game just finished
+                save_game(game_state, player_1, player_2)
             game_over = True
             draw_text(screen, 'Stalemate' if game_state.stalemate else 'Black wins by checkmate' if game_state.whiteToMove else 'White wins by checkmate ')
         clock.tick(MAX_FPS)
@@ -220,6 +223,15 @@ def animate_move(move, screen, board, clock):
         clock.tick(60)  # FPS
 
 
+"""
+Append the game to the PGN file
+"""
+def save_game(game_state, player_1, player_2):
+    with open(PGN_FILE, "a") as file:
+        ChessPGN.writeGame(file, game_state, {"White": "Human" if player_1 else "ChessAI",
+                                              "Black": "Human" if player_2 else "ChessAI"})
+
+
 """
 Draw text over the screen
 """
@@ -0,0 +1,295 @@
+"""
+Reading and writing games in PGN. Moves are encoded and decoded in Standard Algebraic Notation (SAN) against
+GameState.getValidMoves(). Games are read one at a time from a stream of lines, so files with millions of games are
+processed in constant memory. Also has a bulk replay mode that validates every move and reports games/second, and a
+self-play mode that writes engine games.
+"""
+import argparse
+import datetime
+import re
+import time
+from Chess import ChessEngine, ChessAI
+
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(=?[NBRQ])?$")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+TAG_PATTERN = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]\s*$')
+MOVETEXT_TOKEN = re.compile(r"\{[^}]*\}?|;[^\n]*|\$\d+|\(|\)|[^\s{}();]+")
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+
+
+class PGNGame:
+    def __init__(self, headers=None, moves=None, result="*"):
+        self.headers = headers if headers is not None else {}
+        self.moves = moves if moves is not None else []  # Moves in SAN
+        self.result = result
+
+
+"""
+Encode a move in SAN. The move must be valid in the current position, i.e. called before the move is made
+"""
+def toSAN(game_state, move, valid_moves=None):
+    if valid_moves is None:
+        valid_moves = game_state.getValidMoves()
+    if move.isCastle:
+        san = "O-O" if move.end_col - move.start_col == 2 else "O-O-O"
+    else:
+        end_square = move.getRankFile(move.end_row, move.end_col)
+        if move.piece_moved[1] == 'P':
+            san = move.cols_to_files[move.start_col] + "x" + end_square if move.isCapture else end_square
+            if move.pawn_promotion:
+                san += "=Q"  # GameState always promotes to a Queen
+        else:
+            # Disambiguate when another piece of the same kind can move to the same square
+            others = [other for other in valid_moves if other.piece_moved == move.piece_moved and
+                      other.end_row == move.end_row and other.end_col == move.end_col and other != move]
+            disambiguation = ""
+            if others:
+                if all(other.start_col != move.start_col for other in others):
+                    disambiguation = move.cols_to_files[move.start_col]
+                elif all(other.start_row != move.start_row for other in others):
+                    disambiguation = move.rows_to_ranks[move.start_row]
+                else:
+                    disambiguation = move.getRankFile(move.start_row, move.start_col)
+            san = move.piece_moved[1] + disambiguation + ("x" if move.isCapture else "") + end_square
+    # Check and checkmate marks
+    game_state.make_move(move)
+    if game_state.in_check():
+        san += "+" if game_state.has_legal_move() else "#"
+    game_state.undo_move()
+    return san
+
+
+"""
+Decode a SAN move to the matching Move from valid_moves. Raises ValueError if it is not a valid move, or if its
+capture, promotion, check or checkmate marks don't match the move
+"""
+def fromSAN(game_state, san, valid_moves=None):
+    if valid_moves is None:
+        valid_moves = game_state.getValidMoves()
+    text = san.rstrip("!?")
+    check_mark = text[-1:] if text[-1:] in ("+", "#") else ""
+    text = text.rstrip("+#").replace("0", "O")
+    if text in ("O-O", "O-O-O"):
+        end_col = 6 if text == "O-O" else 2
+        for move in valid_moves:
+            if move.isCastle and move.end_col == end_col:
+                break
+        else:
+            raise ValueError("Illegal move: " + san)
+    else:
+        match = SAN_PATTERN.match(text)
+        if match is None:
+            raise ValueError("Not a SAN move: " + san)
+        piece, from_file, from_rank, capture, end_square, promotion = match.groups()
+        if promotion is not None and promotion[-1] != 'Q':
+            raise ValueError("Only promotion to a Queen is supported: " + san)
+        piece = piece or 'P'
+        end_row = ChessEngine.Move.ranks_to_rows[end_square[1]]
+        end_col = ChessEngine.Move.files_to_cols[end_square[0]]
+        candidates = [move for move in valid_moves if move.piece_moved[1] == piece and not move.isCastle and
+                      move.end_row == end_row and move.end_col == end_col and
+                      (from_file is None or move.start_col == ChessEngine.Move.files_to_cols[from_file]) and
+                      (from_rank is None or move.start_row == ChessEngine.Move.ranks_to_rows[from_rank])]
+        if len(candidates) != 1:
+            raise ValueError(("Ambiguous move: " if candidates else "Illegal move: ") + san)
+        move = candidates[0]
+        if (capture is not None) != move.isCapture:
+            raise ValueError("Capture mark does not match the move: " + san)
+        if (promotion is not None) != move.pawn_promotion:
+            raise ValueError("Promotion does not match the move: " + san)
+    game_state.make_move(move)
+    if game_state.in_check():
+        expected_mark = "+" if game_state.has_legal_move() else "#"
+    else:
+        expected_mark = ""
+    game_state.undo_move()
+    if check_mark != expected_mark:
+        raise ValueError("Check mark does not match the move: " + san)
+    return move
+
+
+"""
+Generator reading games one at a time from an iterable of lines, e.g. an open file. Only the current game is kept in
+memory. Comments, variations and NAGs are skipped. A tag pair line starts a new game when it follows movetext, or a
+blank line after the headers of a game without moves, but not inside a {} comment spanning several lines
+"""
+def readGames(lines):
+    headers = {}
+    movetext = []
+    in_comment = False  # A { comment is still open at the end of the previous line
+    headers_done = False  # Blank line seen after the headers
+    for line in lines:
+        line = line.strip()
+        if not in_comment:
+            if line.startswith("%"):  # Escape line
+                continue
+            if line.startswith("["):
+                if movetext or headers_done:  # Tag pair after movetext or after a finished header section
+                    yield parseGame(headers, movetext)
+                    headers = {}
+                    movetext = []
+                    headers_done = False
+                match = TAG_PATTERN.match(line)
+                if match is not None:
+                    headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                continue
+            if not line:
+                headers_done = bool(headers)
+                continue
+        movetext.append(line)
+        in_comment = commentOpen(line, in_comment)
+    if headers or movetext:
+        yield parseGame(headers, movetext)
+
+
+"""
+Whether a { comment is still open at the end of a movetext line. in_comment is the state at the start of the line
+"""
+def commentOpen(line, in_comment):
+    for char in line:
+        if in_comment:
+            in_comment = char != "}"
+        elif char == "{":
+            in_comment = True
+        elif char == ";":  # Rest of line comment, braces in it don't count
+            break
+    return in_comment
+
+
+def parseGame(headers, movetext):
+    moves = []
+    result = headers.get("Result", "*")
+    variation_depth = 0
+    for token in MOVETEXT_TOKEN.findall("\n".join(movetext)):
+        if token == "(":
+            variation_depth += 1
+        elif token == ")":
+            variation_depth -= 1
+        elif variation_depth > 0 or token[0] in "{;$":
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            token = MOVE_NUMBER.sub("", token)
+            if token:
+                moves.append(token)
+    return PGNGame(headers, moves, result)
+
+
+"""
+Result of the game in the current position
+"""
+def gameResult(game_state):
+    if game_state.checkmate:
+        return "0-1" if game_state.whiteToMove else "1-0"
+    elif game_state.stalemate:
+        return "1/2-1/2"
+    return "*"
+
+
+"""
+Write a game played on game_state as PGN. The moves are replayed from the starting position to encode them in SAN
+"""
+def writeGame(file, game_state, headers=None, result=None):
+    replay = ChessEngine.GameState()
+    sans = []
+    for played in game_state.moveLog:
+        valid_moves = replay.getValidMoves()
+        move = next(move for move in valid_moves if move == played)
+        sans.append(toSAN(replay, move, valid_moves))
+        replay.make_move(move)
+    replay.getValidMoves()  # Sets checkmate and stalemate for the final position
+    if result is None:
+        result = gameResult(replay)
+    tags = {"Event": "?", "Site": "?", "Date": datetime.date.today().strftime("%Y.%m.%d"), "Round": "?",
+            "White": "?", "Black": "?"}
+    tags.update(headers or {})
+    tags["Result"] = result
+    for tag in SEVEN_TAG_ROSTER + tuple(t for t in tags if t not in SEVEN_TAG_ROSTER):
+        file.write('[%s "%s"]\n' % (tag, str(tags[tag]).replace("\\", "\\\\").replace('"', '\\"')))
+    file.write("\n")
+    tokens = []
+    for i, san in enumerate(sans):
+        tokens.append(("%d. %s" % (i // 2 + 1, san)) if i % 2 == 0 else san)
+    tokens.append(result)
+    line = ""
+    for token in tokens:  # Keep lines under 80 characters
+        if line and len(line) + 1 + len(token) > 79:
+            file.write(line + "\n")
+            line = token
+        else:
+            line = line + " " + token if line else token
+    file.write(line + "\n\n")
+
+
+"""
+Replay every game of a PGN file, validating each move against getValidMoves(). Reports games/second and moves/second
+"""
+def replayGames(path, limit=None):
+    games = moves = errors = skipped = 0
+    start = time.perf_counter()
+    with open(path) as file:
+        for game in readGames(file):
+            if limit is not None and games + skipped >= limit:
+                break
+            if "FEN" in game.headers:  # Games from a set up position are not supported
+                skipped += 1
+                continue
+            game_state = ChessEngine.GameState()
+            try:
+                for san in game.moves:
+                    game_state.make_move(fromSAN(game_state, san))
+                    moves += 1
+            except ValueError as e:
+                errors += 1
+                print("Game %d, move %d: %s" % (games + skipped + 1, len(game_state.moveLog) + 1, e))
+            games += 1
+    elapsed = time.perf_counter() - start
+    print("Games: %d (%d with errors, %d skipped)" % (games, errors, skipped))
+    print("Moves: %d" % moves)
+    print("Time:  %.2fs, %.1f games/s, %.0f moves/s" % (elapsed, games / elapsed if elapsed else 0.0,
+                                                        moves / elapsed if elapsed else 0.0))
+    return errors == 0
+
+
+"""
+Let the AI play against itself and write the games to a PGN file
+"""
+def selfPlay(path, games, depth=ChessAI.DEPTH, max_moves=200):
+    with open(path, "a") as file:
+        for i in range(games):
+            game_state = ChessEngine.GameState()
+            valid_moves = game_state.getValidMoves()
+            while valid_moves and len(game_state.moveLog) < max_moves:
+                move = ChessAI.findBestMove(game_state, valid_moves, depth)
+                if move is None:
+                    move = ChessAI.findRandomMove(valid_moves)
+                game_state.make_move(move)
+                valid_moves = game_state.getValidMoves()
+            writeGame(file, game_state, {"Event": "Self-play", "Round": i + 1, "White": "ChessAI depth %d" % depth,
+                                         "Black": "ChessAI depth %d" % depth})
+            print("Game %d: %s in %d moves" % (i + 1, gameResult(game_state), len(game_state.moveLog)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PGN replay and self-play")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_parser = commands.add_parser("replay", help="validate every move of a PGN file and report throughput")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--limit", type=int, help="stop after this many games")
+    self_play_parser = commands.add_parser("selfplay", help="append AI vs AI games to a PGN file")
+    self_play_parser.add_argument("path")
+    self_play_parser.add_argument("--games", type=int, default=1)
+    self_play_parser.add_argument("--depth", type=int, default=ChessAI.DEPTH)
+    self_play_parser.add_argument("--max-moves", type=int, default=200, help="half moves before a game is stopped")
+    args = parser.parse_args()
+    if args.command == "replay":
+        if not replayGames(args.path, args.limit):
+            raise SystemExit(1)
+    else:
+        selfPlay(args.path, args.games, args.depth, args.max_moves)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Headless game server. Hosts many concurrent games over TCP or a Unix socket using a JSON line protocol, one request
+and one response per line:
+
+    {"op": "new"}                                   -> start a game, returns its id and state
+    {"op": "move", "game": id, "move": "e2e4"}      -> play a human move, checked against getValidMoves()
+    {"op": "ai", "game": id, "time_limit": 5}       -> let the engine play a move for the side to move
+    {"op": "state", "game": id}                     -> current state of a game
+    {"op": "close", "game": id}                     -> end a game and free its session
+    {"op": "metrics"}                               -> per request latency and throughput numbers
+
+Every response has "ok". Failed requests carry an "error" message, and an optional "id" in the request is echoed back.
+Engine searches run in a bounded process pool. When the pool and its queue are full, "ai" requests are rejected with
+"busy" instead of piling up, and a search that exceeds the game's time limit is answered with a random move.
+Games are owned by the connection that created them: other connections get "unknown game" for them, and they are
+closed when the owner disconnects.
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import json
+import math
+import time
+from Chess import ChessEngine, ChessAI
+
+
+"""
+Replay a game from its coordinate notation move log
+"""
+def replayGame(move_log):
+    game_state = ChessEngine.GameState()
+    for notation in move_log:
+        for move in game_state.getValidMoves():
+            if move.getChessNotation() == notation:
+                game_state.make_move(move)
+                break
+        else:
+            raise ValueError("Illegal move in move log: " + notation)
+    return game_state
+
+
+"""
+Runs in a worker process. Searches the position reached after move_log and returns the chosen move in coordinate
+notation
+"""
+def searchMove(move_log, depth):
+    game_state = replayGame(move_log)
+    valid_moves = game_state.getValidMoves()
+    move = ChessAI.findBestMove(game_state, valid_moves, depth)
+    if move is None:
+        move = ChessAI.findRandomMove(valid_moves)
+    return move.getChessNotation()
+
+
+class GameSession:
+    def __init__(self, game_id, time_limit):
+        self.game_id = game_id
+        self.game_state = ChessEngine.GameState()
+        self.valid_moves = self.game_state.getValidMoves()
+        self.time_limit = time_limit
+        self.lock = asyncio.Lock()  # One request at a time per game
+
+    """
+    Play a move from the valid move list with the given coordinate notation. Returns False if it is not valid
+    """
+    def play(self, notation):
+        for move in self.valid_moves:
+            if move.getChessNotation() == notation:
+                self.game_state.make_move(move)
+                self.valid_moves = self.game_state.getValidMoves()
+                return True
+        return False
+
+    def status(self):
+        if self.game_state.checkmate:
+            return "checkmate"
+        elif self.game_state.stalemate:
+            return "stalemate"
+        return "ongoing"
+
+    def toDict(self):
+        return {"game": self.game_id,
+                "to_move": "w" if self.game_state.whiteToMove else "b",
+                "status": self.status(),
+                "last_move": str(self.game_state.moveLog[-1]) if self.game_state.moveLog else None,
+                "moves": [move.getChessNotation() for move in self.valid_moves]}
+
+
+class Metrics:
+    def __init__(self, window=10000):
+        self.started = time.perf_counter()
+        self.counts = collections.Counter()
+        self.errors = collections.Counter()
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self.ai_timeouts = 0
+        self.ai_rejected = 0
+
+    def record(self, op, latency, ok):
+        self.counts[op] += 1
+        if not ok:
+            self.errors[op] += 1
+        self.latencies[op].append(latency)
+
+    def toDict(self):
+        uptime = time.perf_counter() - self.started
+        ops = {}
+        for op, count in self.counts.items():
+            samples = sorted(self.latencies[op])
+            ops[op] = {"count": count,
+                       "errors": self.errors[op],
+                       "mean_ms": 1000 * sum(samples) / len(samples),
+                       "p50_ms": 1000 * percentile(samples, 50),
+                       "p95_ms": 1000 * percentile(samples, 95),
+                       "max_ms": 1000 * samples[-1]}
+        total = sum(self.counts.values())
+        return {"uptime_s": uptime,
+                "requests": total,
+                "requests_per_s": total / uptime if uptime > 0 else 0.0,
+                "ai_timeouts": self.ai_timeouts,
+                "ai_rejected": self.ai_rejected,
+                "ops": ops}
+
+
+"""
+Nearest-rank percentile of an already sorted list
+"""
+def percentile(samples, pct):
+    if len(samples) == 0:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(pct / 100 * len(samples))) - 1))
+    return samples[index]
+
+
+class RequestError(Exception):
+    pass
+
+
+"""
+Read a time limit in seconds from a request, capped at maximum. Must be a finite number greater than 0
+"""
+def parseTimeLimit(value, maximum):
+    try:
+        time_limit = float(value)
+    except (TypeError, ValueError):
+        raise RequestError("time_limit must be a number")
+    if not math.isfinite(time_limit) or time_limit <= 0:
+        raise RequestError("time_limit must be a finite number greater than 0")
+    return min(time_limit, maximum)
+
+
+class GameServer:
+    def __init__(self, workers=2, queue_size=8, depth=ChessAI.DEPTH, time_limit=10.0, max_games=1000):
+        self.workers = workers
+        self.max_pending = workers + queue_size  # Searches running plus searches waiting for a worker
+        self.pending = 0
+        self.depth = depth
+        self.time_limit = time_limit
+        self.max_games = max_games
+        self.sessions = {}
+        self.game_ids = itertools.count(1)
+        self.metrics = Metrics()
+        self.pool = None
+        self.handlers = {'new': self.newGame, 'move': self.humanMove, 'ai': self.aiMove, 'state': self.gameState,
+                         'close': self.closeGame, 'metrics': self.getMetrics}
+
+    def start(self):
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+
+    """
+    Session of the game in the request. With connection_games set, only games created on that connection are found
+    """
+    def getSession(self, request, connection_games=None):
+        game_id = request.get("game")
+        if connection_games is not None and game_id not in connection_games:
+            raise RequestError("unknown game")
+        session = self.sessions.get(game_id)
+        if session is None:
+            raise RequestError("unknown game")
+        return session
+
+    async def newGame(self, request, connection_games=None):
+        if len(self.sessions) >= self.max_games:
+            raise RequestError("too many games")
+        time_limit = parseTimeLimit(request.get("time_limit", self.time_limit), self.time_limit)
+        session = GameSession(next(self.game_ids), time_limit)
+        self.sessions[session.game_id] = session
+        if connection_games is not None:
+            connection_games.add(session.game_id)
+        return session.toDict()
+
+    async def humanMove(self, request, connection_games=None):
+        session = self.getSession(request, connection_games)
+        async with session.lock:
+            if not session.play(str(request.get("move"))):
+                raise RequestError("invalid move")
+            return session.toDict()
+
+    async def aiMove(self, request, connection_games=None):
+        session = self.getSession(request, connection_games)
+        async with session.lock:
+            if len(session.valid_moves) == 0:
+                raise RequestError("game is over")
+            if self.pending >= self.max_pending:  # Backpressure - don't queue more work than the pool can take
+                self.metrics.ai_rejected += 1
+                raise RequestError("busy")
+            time_limit = parseTimeLimit(request.get("time_limit", session.time_limit), session.time_limit)
+            move_log = [move.getChessNotation() for move in session.game_state.moveLog]
+            self.pending += 1
+            future = asyncio.get_running_loop().run_in_executor(self.pool, searchMove, move_log, self.depth)
+            future.add_done_callback(self.searchDone)
+            try:
+                # shield() keeps the worker's result future alive so pending is only released once the process is
+                # actually free again
+                notation = await asyncio.wait_for(asyncio.shield(future), time_limit)
+                timed_out = False
+            except asyncio.TimeoutError:
+                self.metrics.ai_timeouts += 1
+                notation = ChessAI.findRandomMove(session.valid_moves).getChessNotation()
+                timed_out = True
+            except Exception as e:  # Worker crashed or the pool is broken
+                raise RequestError("search failed: " + repr(e))
+            session.play(notation)
+            state = session.toDict()
+            state["timed_out"] = timed_out
+            return state
+
+    def searchDone(self, future):
+        self.pending -= 1
+
+    async def gameState(self, request, connection_games=None):
+        return self.getSession(request, connection_games).toDict()
+
+    async def closeGame(self, request, connection_games=None):
+        session = self.getSession(request, connection_games)
+        del self.sessions[session.game_id]
+        if connection_games is not None:
+            connection_games.discard(session.game_id)
+        return {"game": session.game_id}
+
+    async def getMetrics(self, request, connection_games=None):
+        metrics = self.metrics.toDict()
+        metrics["games"] = len(self.sessions)
+        metrics["pending_searches"] = self.pending
+        return metrics
+
+    """
+    Handle one request line from a connection owning connection_games. Games created or closed by the request are added
+    to or removed from connection_games. Without connection_games every game can be accessed
+    """
+    async def handleRequest(self, line, connection_games=None):
+        start = time.perf_counter()
+        op = "invalid"
+        request = {}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError("request must be a JSON object")
+            op = request.get("op")
+            handler = self.handlers.get(op) if isinstance(op, str) else None
+            if handler is None:
+                op = "invalid"
+                raise RequestError("unknown op")
+            response = await handler(request, connection_games)
+            response["ok"] = True
+        except (RequestError, ValueError, TypeError) as e:
+            response = {"ok": False, "error": str(e)}
+        if isinstance(request, dict) and "id" in request:
+            response["id"] = request["id"]
+        self.metrics.record(op, time.perf_counter() - start, response["ok"])
+        return response
+
+    async def handleClient(self, reader, writer):
+        connection_games = set()  # Games created on this connection, closed when it goes away
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError as e:  # Last line without a newline
+                    line = e.partial
+                except asyncio.LimitOverrunError:  # Line longer than the stream limit
+                    await discardLine(reader)
+                    line = None
+                if line is None:
+                    self.metrics.record("invalid", 0.0, False)
+                    response = {"ok": False, "error": "request line too long"}
+                elif not line:
+                    break
+                else:
+                    response = await self.handleRequest(line, connection_games)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in connection_games:
+                self.sessions.pop(game_id, None)
+            writer.close()
+
+
+"""
+Skip the rest of the current line, up to and including its newline, so it isn't read as further requests
+"""
+async def discardLine(reader):
+    while True:
+        try:
+            await reader.readuntil(b"\n")
+            return
+        except asyncio.LimitOverrunError as e:  # No newline within the limit yet, drop what has been buffered
+            await reader.readexactly(e.consumed)
+        except asyncio.IncompleteReadError:  # Connection closed
+            return
+
+
+async def serve(game_server, host="127.0.0.1", port=8765, unix_path=None):
+    game_server.start()
+    try:
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(game_server.handleClient, path=unix_path, backlog=1024)
+        else:
+            server = await asyncio.start_server(game_server.handleClient, host, port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+    finally:
+        game_server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-game chess server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=2, help="engine worker processes")
+    parser.add_argument("--queue", type=int, default=8, help="searches allowed to wait for a free worker")
+    parser.add_argument("--depth", type=int, default=ChessAI.DEPTH, help="engine search depth")
+    parser.add_argument("--time-limit", type=float, default=10.0, help="maximum seconds per engine move")
+    parser.add_argument("--max-games", type=int, default=1000)
+    args = parser.parse_args()
+    game_server = GameServer(args.workers, args.queue, args.depth, args.time_limit, args.max_games)
+    try:
+        asyncio.run(serve(game_server, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        print(json.dumps(game_server.metrics.toDict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Consistency tests for the fast paths of the engine. Each one is checked against the plain implementation it replaces,
+over seeded random games and a few set up positions.
+"""
+import io
+import random
+import numpy as np
+import pytest
+from Chess import ChessEngine, ChessAI, ChessArray, ChessBenchmark, ChessPGN
+
+FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",  # En passant
+    "r3k2r/pppppppp/8/8/8/8/PPPPPPPP/R3K2R w KQkq - 0 1",  # Castling on both sides
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/P1k5/8/8/8/8/5Kp1/8 w - - 0 1",  # Promotion for both sides
+    "rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3",  # Checkmate
+    "7k/5Q2/6K1/8/8/8/8/8 b - - 0 1",  # Stalemate
+]
+
+
+"""
+Generator playing seeded random games from each FEN and yielding the game state before every move
+"""
+def randomPositions(games_per_fen=3, max_moves=120, seed=0):
+    rng = random.Random(seed)
+    for fen in FENS:
+        for _ in range(games_per_fen):
+            game_state = ChessEngine.GameState()
+            game_state.load_fen(fen)
+            for _ in range(max_moves):
+                yield game_state
+                valid_moves = game_state.getValidMoves()
+                if len(valid_moves) == 0:
+                    break
+                game_state.make_move(valid_moves[rng.randint(0, len(valid_moves) - 1)])
+
+
+def test_update_game_status_matches_getValidMoves():
+    for game_state in randomPositions():
+        game_state.update_game_status()
+        status = (game_state.checkmate, game_state.stalemate, game_state.in_check_status)
+        has_legal_move = game_state.has_legal_move()
+        game_state.getValidMoves()
+        assert status[:2] == (game_state.checkmate, game_state.stalemate)
+        assert has_legal_move == (not game_state.checkmate and not game_state.stalemate)
+        assert status[2] in (None, game_state.in_check())
+        assert game_state.is_in_check() == game_state.in_check()
+
+
+def test_staged_moves_match_getValidMoves():
+    rng = random.Random(1)
+    previous_moves = []
+    for game_state in randomPositions():
+        valid_moves = game_state.getValidMoves()
+        # Hash moves are a valid move, a move from the previous position that may not be valid here, or none
+        candidates = valid_moves + previous_moves + [None]
+        hash_move = candidates[rng.randint(0, len(candidates) - 1)]
+        staged = [(move.moveID, move.isCapture, move.isEnpassant, move.isCastle, move.pawn_promotion)
+                  for move in game_state.staged_moves(hash_move)]
+        assert len(staged) == len(set(staged))
+        assert set(staged) == {(move.moveID, move.isCapture, move.isEnpassant, move.isCastle, move.pawn_promotion)
+                               for move in valid_moves}
+        if hash_move is not None and hash_move in valid_moves:
+            assert staged[0][0] == hash_move.moveID
+        previous_moves = valid_moves
+
+
+def test_pawn_hash_across_make_and_undo():
+    for game_state in randomPositions():
+        pawn_hash = game_state.pawn_hash
+        assert pawn_hash == game_state.computePawnHash()
+        for move in game_state.getValidMoves():  # Every kind of move, including captures, en passant and promotions
+            game_state.make_move(move)
+            assert game_state.pawn_hash == game_state.computePawnHash()
+            game_state.undo_move()
+            assert game_state.pawn_hash == pawn_hash
+
+
+def test_pawn_structure_terms():
+    positions = [
+        ("4k3/8/8/8/8/8/8/4K3 w - - 0 1", 0),
+        # White d2 against black c7 and e7: all three isolated, none passed
+        ("4k3/2p1p3/8/8/8/8/3P4/4K3 w - - 0 1", -ChessAI.ISOLATED_PAWN + 2 * ChessAI.ISOLATED_PAWN),
+        # Doubled isolated white pawns on the a file, a4 is passed
+        ("4k3/8/8/8/P7/P7/8/4K3 w - - 0 1", -ChessAI.DOUBLED_PAWN - 2 * ChessAI.ISOLATED_PAWN +
+         ChessAI.PASSED_PAWN[4] + ChessAI.PASSED_PAWN[5]),
+        # Black b2 is passed, one row from promoting, and the blocked white c5 pawn is isolated
+        ("4k3/8/2p5/2P5/8/8/1p6/4K3 b - - 0 1", -ChessAI.PASSED_PAWN[1] - ChessAI.ISOLATED_PAWN),
+    ]
+    for fen, expected in positions:
+        game_state = ChessEngine.GameState()
+        game_state.load_fen(fen)
+        assert ChessAI.evaluatePawnStructure(game_state.board) == pytest.approx(expected), fen
+        # The same position with the colours swapped and the board flipped scores the other way round
+        mirrored = [[("w" if square[0] == "b" else "b") + square[1] if square != "--" else square for square in row]
+                    for row in game_state.board[::-1]]
+        assert ChessAI.evaluatePawnStructure(mirrored) == pytest.approx(-expected), fen
+
+
+def test_checkmate_and_stalemate_positions():
+    game_state = ChessEngine.GameState()
+    game_state.load_fen(FENS[5])
+    game_state.update_game_status()
+    assert game_state.checkmate and not game_state.stalemate and game_state.in_check_status
+    game_state.load_fen(FENS[6])
+    game_state.update_game_status()
+    assert game_state.stalemate and not game_state.checkmate and game_state.in_check_status is False
+
+
+def test_san_round_trip():
+    rng = random.Random(0)
+    buffer = io.StringIO()
+    played = []
+    for _ in range(10):
+        game_state = ChessEngine.GameState()
+        for _ in range(200):
+            valid_moves = game_state.getValidMoves()
+            if len(valid_moves) == 0:
+                break
+            game_state.make_move(valid_moves[rng.randint(0, len(valid_moves) - 1)])
+        ChessPGN.writeGame(buffer, game_state)
+        buffer.write("\n")
+        played.append([move.moveID for move in game_state.moveLog])
+    buffer.seek(0)
+    games = list(ChessPGN.readGames(buffer))
+    assert len(games) == len(played)
+    for game, move_ids in zip(games, played):
+        game_state = ChessEngine.GameState()
+        for san in game.moves:
+            game_state.make_move(ChessPGN.fromSAN(game_state, san))
+        assert [move.moveID for move in game_state.moveLog] == move_ids
+    assert any("+" in san for game in games for san in game.moves)
+
+
+def test_san_disambiguation_and_check_marks():
+    positions = [
+        ("4k3/8/8/8/8/8/8/1N2KN2 w - - 0 1", {"Nbd2", "Nfd2"}),  # Two knights reaching the same square
+        ("4k3/R7/8/8/8/8/8/R3K3 w - - 0 1", {"R1a4", "R7a4", "Ra8+"}),  # Two rooks on the same file
+        ("6k1/5ppp/8/8/8/8/8/R3K3 w - - 0 1", {"Ra8#"}),
+    ]
+    for fen, expected in positions:
+        game_state = ChessEngine.GameState()
+        game_state.load_fen(fen)
+        valid_moves = game_state.getValidMoves()
+        sans = set()
+        for move in valid_moves:
+            san = ChessPGN.toSAN(game_state, move, valid_moves)
+            assert ChessPGN.fromSAN(game_state, san, valid_moves) == move
+            sans.add(san)
+        assert expected <= sans
+
+
+def test_fromSAN_checks_capture_promotion_and_check_marks():
+    cases = [
+        (FENS[0], ["Nf3", "e4"], ["Nxf3", "Nf3+", "exe4"]),
+        (FENS[1], ["exf6", "exf6!?"], ["ef6", "exf6+"]),  # En passant is a capture
+        (FENS[4], ["a8=Q", "a8Q"], ["a8", "a8=Q+"]),  # Promotion without a suffix
+        ("6k1/5ppp/8/8/8/8/8/R3K3 w - - 0 1", ["Ra8#"], ["Ra8", "Ra8+"]),
+        ("4k3/8/8/8/8/8/8/R3K3 w Q - 0 1", ["O-O-O", "Ra8+"], ["O-O-O+", "Ra8"]),
+    ]
+    for fen, valid, invalid in cases:
+        game_state = ChessEngine.GameState()
+        game_state.load_fen(fen)
+        for san in valid:
+            ChessPGN.fromSAN(game_state, san)
+        for san in invalid:
+            with pytest.raises(ValueError):
+                ChessPGN.fromSAN(game_state, san)
+        assert len(game_state.moveLog) == 0
+
+
+def test_read_games_comments_and_empty_games():
+    text = ['[Event "a"]', '', '1. e4 {a comment', '[%clk 0:01:00] spanning} e5 2. Nf3 (2. f4 exf4) Nc6 1-0', '',
+            '[Event "b"]', '', '[Event "c"]', '', '1. d4 d5 *']
+    games = list(ChessPGN.readGames(text))
+    assert [game.headers["Event"] for game in games] == ["a", "b", "c"]
+    assert [game.moves for game in games] == [["e4", "e5", "Nf3", "Nc6"], [], ["d4", "d5"]]
+    assert games[0].result == "1-0"
+
+
+def test_mate_puzzles_need_fewer_nodes_than_negamax():
+    for name, mate_in, fen in ChessBenchmark.MATE_PUZZLES:
+        game_state = ChessEngine.GameState()
+        game_state.load_fen(fen)
+        status, line, mate_nodes = ChessAI.findMateInN(game_state, mate_in)
+        assert status == "mate" and len(line) == 2 * mate_in - 1, name  # Full length line, the defender resists
+        for move in line:
+            game_state.make_move(move)
+        game_state.update_game_status()
+        assert game_state.checkmate, name
+        _, negamax_nodes = ChessBenchmark.search("negamax", fen, 2 * mate_in - 1, 0)
+        assert mate_nodes < negamax_nodes, name
+
+
+def test_benchmark_search_leaves_search_settings_alone():
+    depth = ChessAI.DEPTH
+    rng_state = ChessAI.rng.getstate()
+    for engine in ChessBenchmark.ENGINES:
+        move, nodes = ChessBenchmark.search(engine, FENS[3], 2, 0)
+        assert move is not None and nodes > 0
+    assert ChessAI.DEPTH == depth and ChessAI.rng.getstate() == rng_state
+
+
+def test_array_conversion_and_batch_scores():
+    boards = [[row[:] for row in game_state.board] for game_state in randomPositions(games_per_fen=1)]
+    for board in boards:
+        assert ChessArray.arrayToBoard(ChessArray.boardToArray(board)) == board
+    positions = ChessArray.boardsToArray(boards)
+    assert positions.shape == (len(boards), 8, 8)
+    material = ChessArray.scoreBoards(positions, piece_square=False)
+    assert np.allclose(material, [ChessAI.scoreMaterial(board) for board in boards])
+    # Colours swapped and the board flipped: the same position for the other side
+    mirrored = -positions[:, ::-1, :]
+    assert np.allclose(ChessArray.scoreBoards(mirrored), -ChessArray.scoreBoards(positions))
+    assert np.allclose(ChessArray.scoreBoards(mirrored, piece_square=False), -material)
+    assert ChessArray.scoreBoards(ChessArray.boardToArray(ChessEngine.GameState().board))[0] == 0
@@ -0,0 +1,91 @@
+"""
+Protocol tests for ChessServer. Requests go straight to GameServer.handleRequest, or through a Unix socket server for
+the connection level behaviour.
+"""
+import asyncio
+import json
+from Chess import ChessServer
+
+
+def request(game_server, line, connection_games=None):
+    if not isinstance(line, bytes):
+        line = json.dumps(line).encode()
+    return asyncio.run(game_server.handleRequest(line, connection_games))
+
+
+def test_malformed_requests():
+    game_server = ChessServer.GameServer()
+    for line in (b"{not json", b"[1, 2]", b'"new"', json.dumps({"op": [1]}).encode(),
+                 json.dumps({"op": {}}).encode(), json.dumps({"op": "nope"}).encode(), json.dumps({}).encode()):
+        response = request(game_server, line)
+        assert response["ok"] is False and response["error"], line
+    assert game_server.metrics.counts["invalid"] == 7
+    assert request(game_server, {"op": "metrics"})["ok"]
+
+
+def test_game_requests():
+    game_server = ChessServer.GameServer()
+    state = request(game_server, {"op": "new", "id": 5})
+    assert state["ok"] and state["id"] == 5 and state["to_move"] == "w" and len(state["moves"]) == 20
+    game = state["game"]
+    assert request(game_server, {"op": "state", "game": game + 1}) == {"ok": False, "error": "unknown game"}
+    assert request(game_server, {"op": "move", "game": game, "move": "e2e5"})["error"] == "invalid move"
+    state = request(game_server, {"op": "move", "game": game, "move": "e2e4"})
+    assert state["ok"] and state["to_move"] == "b" and state["last_move"] is not None
+    for time_limit in ("soon", None, -1, 0, float("nan"), float("inf")):
+        response = request(game_server, {"op": "ai", "game": game, "time_limit": time_limit})
+        assert response["ok"] is False and "time_limit" in response["error"], time_limit
+        response = request(game_server, {"op": "new", "time_limit": time_limit})
+        assert response["ok"] is False and "time_limit" in response["error"], time_limit
+    game_server.pending = game_server.max_pending  # Every worker busy and the queue full
+    assert request(game_server, {"op": "ai", "game": game})["error"] == "busy"
+    assert game_server.metrics.ai_rejected == 1
+    assert request(game_server, {"op": "close", "game": game}) == {"ok": True, "game": game}
+    assert game not in game_server.sessions
+
+
+def test_games_are_owned_by_their_connection():
+    game_server = ChessServer.GameServer()
+    owner, other = set(), set()
+    game = request(game_server, {"op": "new"}, owner)["game"]
+    assert owner == {game}
+    for op in ("state", "move", "ai", "close"):
+        assert request(game_server, {"op": op, "game": game, "move": "e2e4"}, other)["error"] == "unknown game"
+    assert request(game_server, {"op": "close", "game": game}, owner)["ok"]
+    assert owner == set() and game not in game_server.sessions
+
+
+def test_connections(tmp_path):
+    path = str(tmp_path / "chess.sock")
+
+    async def exchange(reader, writer, request):
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        return json.loads(await reader.readline())
+
+    async def run():
+        game_server = ChessServer.GameServer()
+        server = await asyncio.start_unix_server(game_server.handleClient, path=path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            game = (await exchange(reader, writer, {"op": "new"}))["game"]
+            # Over-long line sent in parts, so the server sees no newline until the end
+            for _ in range(4):
+                writer.write(b"x" * 50000)
+                await writer.drain()
+                await asyncio.sleep(0.01)
+            writer.write(b"\n")
+            response = json.loads(await reader.readline())
+            assert response == {"ok": False, "error": "request line too long"}
+            # The rest of the long line was dropped, the next response belongs to the next request
+            assert (await exchange(reader, writer, {"op": "state", "game": game, "id": 1}))["id"] == 1
+            assert game in game_server.sessions
+            writer.close()
+            await writer.wait_closed()
+            for _ in range(100):
+                if game not in game_server.sessions:
+                    break
+                await asyncio.sleep(0.01)
+            assert game not in game_server.sessions  # Freed when the connection went away
+
+    asyncio.run(run())